@@ -29,9 +29,11 @@ def divide_expression(F: Expr, d: Cube) -> Tuple[Expr, Expr]:
     Q: Expr = set()
     R: Expr = set()
 
+    # frozenset difference already returns a frozenset, so each cube is
+    # classified with one subset test and at most one allocation.
     for c in F:
-        if d.issubset(c):
-            Q.add(frozenset(c - d))
+        if d <= c:
+            Q.add(c - d)
         else:
             R.add(c)
 
@@ -43,10 +45,9 @@ def multiply_cube_expr(d: Cube, Q: Expr) -> Expr:
     Compute d * Q (distribute cube d into every cube of Q):
         d * (sum of cubes) = sum of (d ∪ cube)
     """
-    out: Expr = set()
-    for qc in Q:
-        out.add(frozenset(set(d) | set(qc)))
-    return out
+    if not isinstance(d, frozenset):
+        d = frozenset(d)
+    return {d | qc for qc in Q}
 
 
 def add_expr(A: Expr, B: Expr) -> Expr:
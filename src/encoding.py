@@ -0,0 +1,102 @@
+from __future__ import annotations
+from typing import Dict, FrozenSet, Iterable, List, Set, Tuple
+
+Literal = str
+Cube = FrozenSet[Literal]
+Expr = Set[Cube]
+
+# A cube encoded as an int bitmask: bit i is set iff literal with id i is present.
+# The empty cube (constant 1) is 0.
+BitCube = int
+BitExpr = Set[BitCube]
+
+
+class LitPool:
+    """
+    Assigns each literal a bit index so cubes can be encoded as int bitmasks.
+
+    With bitmask cubes, the set algebra used all over the synthesis pipeline
+    collapses to single int operations:
+        subset        d ⊆ c   ->  (c & d) == d
+        union         d ∪ c   ->  d | c
+        difference    c - d   ->  c & ~d
+        intersection  c ∩ d   ->  c & d
+        literal count len(c)  ->  c.bit_count()
+
+    Python ints are arbitrary precision, so any number of literals works;
+    the first 64 literals stay within one machine word.
+    """
+
+    def __init__(self):
+        self.lit_to_bit: Dict[Literal, int] = {}
+        self.bit_to_lit: List[Literal] = []
+
+    def bit(self, lit: Literal) -> int:
+        """Return the bit index for a literal, assigning a new one if needed."""
+        b = self.lit_to_bit.get(lit)
+        if b is None:
+            b = len(self.bit_to_lit)
+            self.lit_to_bit[lit] = b
+            self.bit_to_lit.append(lit)
+        return b
+
+    def encode_cube(self, c: Cube) -> BitCube:
+        mask = 0
+        for lit in c:
+            mask |= 1 << self.bit(lit)
+        return mask
+
+    def decode_cube(self, mask: BitCube) -> Cube:
+        lits = []
+        while mask:
+            b = (mask & -mask).bit_length() - 1  # lowest set bit
+            lits.append(self.bit_to_lit[b])
+            mask &= mask - 1
+        return frozenset(lits)
+
+    def encode_expr(self, e: Expr) -> BitExpr:
+        return {self.encode_cube(c) for c in e}
+
+    def decode_expr(self, e: Iterable[BitCube]) -> Expr:
+        return {self.decode_cube(m) for m in e}
+
+
+# --- bitmask algebra on encoded expressions ---
+
+def common_cube_bits(expr: Iterable[BitCube]) -> BitCube:
+    """Intersection of literals across all cubes (0 for the empty expression)."""
+    common = -1
+    for c in expr:
+        common &= c
+        if common == 0:
+            return 0
+    return 0 if common == -1 else common
+
+
+def is_cube_free_bits(expr: Iterable[BitCube]) -> bool:
+    """Cube-free iff no literal is shared by every cube."""
+    return common_cube_bits(expr) == 0
+
+
+def divide_expression_bits(F: Iterable[BitCube], d: BitCube) -> Tuple[BitExpr, BitExpr]:
+    """
+    Algebraic division F = d * Q + R on encoded cubes.
+
+    Q = { c & ~d : c in F, d ⊆ c }
+    R = { c : c in F, d ⊄ c }
+    """
+    if d == 0:
+        return set(F), set()
+    Q: BitExpr = set()
+    R: BitExpr = set()
+    for c in F:
+        if (c & d) == d:
+            Q.add(c & ~d)
+        else:
+            R.add(c)
+    return Q, R
+
+
+def multiply_cube_expr_bits(d: BitCube, Q: Iterable[BitCube]) -> BitExpr:
+    """Distribute cube d into every cube of Q: d * sum(cubes) = sum(d | cube)."""
+    return {d | c for c in Q}
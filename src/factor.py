@@ -7,21 +7,18 @@ Literal = str
 Cube = FrozenSet[Literal]
 Expr = Set[Cube]
 
+__all__ = [
+    "apply_rectangle_once",
+    "extract_common_cube_once",
+    "extract_single_row_node_once",
+]
+
 
 def _union_expr(exprs: Iterable[Expr]) -> Expr:
     """OR (sum) of expressions -> set union of cubes."""
     out: Expr = set()
     for e in exprs:
-        out |= set(e)
-    return out
-
-
-def _multiply_cube_expr(co: Cube, e: Expr) -> Expr:
-    """Distribute cube 'co' into SOP expression e: co * sum(cubes) = sum(co ∪ cube)."""
-    out: Expr = set()
-    co_set = set(co)
-    for c in e:
-        out.add(frozenset(co_set | set(c)))
+        out.update(e)
     return out
 
 
@@ -70,13 +67,25 @@ def apply_rectangle_once(
     if not rect.rows:
         raise ValueError("Rectangle has no rows; cannot extract.")
 
-    covered: Expr = set()
+    # Single pass over the (row, kernel-cube) products: each covered cube is
+    # classified as present (to remove) or missing on the spot, instead of
+    # materializing the full covered set and then computing covered - F and
+    # covered & F as separate set operations.
+    # Missing cubes only matter for the strict error / warning message, so
+    # don't collect them at all on the silent fast path.
+    track_missing = strict or warn
+    removed: Expr = set()
+    missing: Expr = set()
     for i in rect.rows:
         co: Cube = KM.rows[i]
-        covered |= _multiply_cube_expr(co, T)
+        for t in T:
+            cube = co | t
+            if cube in F:
+                removed.add(cube)
+            elif track_missing:
+                missing.add(cube)
 
     # --- 3) remove covered cubes from F (exactly or best-effort) ---
-    missing = covered - F
     if missing:
         if strict:
             # show a small sample to help debug
@@ -92,18 +101,47 @@ def apply_rectangle_once(
                 f"removing only those cubes that actually appear."
             )
 
-    removed: Expr = covered & F
     newF: Expr = set(F) - removed
 
     # --- 4) add replacement cubes: co * new_node for each selected row ---
+    nn = frozenset({new_node})
     for i in rect.rows:
-        co: Cube = KM.rows[i]
-        newF.add(frozenset(set(co) | {new_node}))
+        newF.add(KM.rows[i] | nn)
 
     # --- 5) store definition ---
     defs: Dict[str, Expr] = {new_node: T}
     return newF, defs, removed
 
+def _groups_by_literal(F: Expr):
+    """
+    Yield (literal, group) pairs where group is the set of cubes of F that
+    contain the literal, for every literal appearing in >= 2 cubes.
+
+    One pass over F replaces the old per-base O(|F|^2) overlap scan: any
+    group of cubes sharing a common cube is found through each of its
+    common literals, and by construction common_cube(group) contains the
+    literal, so it is never empty. Literals are visited in sorted order
+    for deterministic extraction choices.
+    """
+    by_lit: Dict[Literal, Set[Cube]] = {}
+    for c in F:
+        for lit in c:
+            by_lit.setdefault(lit, set()).add(c)
+
+    # Literals of one common cube index the identical group (e.g. 'a' and
+    # 'b' in {abx, aby}); yield each distinct group once.
+    seen_groups: Set[FrozenSet[Cube]] = set()
+    for lit in sorted(by_lit):
+        group = by_lit[lit]
+        if len(group) < 2:
+            continue
+        key = frozenset(group)
+        if key in seen_groups:
+            continue
+        seen_groups.add(key)
+        yield lit, group
+
+
 def extract_common_cube_once(F: Expr):
     """
     Perform one algebraic common-cube extraction on F, if possible.
@@ -117,31 +155,20 @@ def extract_common_cube_once(F: Expr):
     if len(F) < 2:
         return F, False
 
-    # Try all subsets of size >= 2 implicitly by grouping
-    cubes = list(F)
-
-    for i in range(len(cubes)):
-        base = cubes[i]
-
-        # Group all cubes sharing something with base
-        group = {c for c in F if c & base}
-
-        if len(group) < 2:
-            continue
-
+    for _, group in _groups_by_literal(F):
         cc = common_cube(group)
         if not cc:
             continue
 
         # Build remainder expression
-        remainder = {frozenset(c - cc) for c in group}
+        remainder = {c - cc for c in group}
 
         # Remove old cubes
         newF = set(F) - group
 
         # Add factored form: cc * remainder
         for r in remainder:
-            newF.add(frozenset(cc | r))
+            newF.add(cc | r)
 
         return newF, True
 
@@ -155,20 +182,13 @@ def extract_single_row_node_once(F: Expr, *, node_prefix: str, next_id: int):
     Returns:
         (newF, new_defs, changed, next_id)
     """
-    cubes = list(F)
-
-    for base in cubes:
-        # Find all cubes sharing a common cube with base
-        group = {c for c in F if c & base}
-        if len(group) < 2:
-            continue
-
+    for _, group in _groups_by_literal(F):
         cc = common_cube(group)
         if not cc:
             continue
 
         # Remainder (what will go into the new node)
-        remainder = {frozenset(c - cc) for c in group}
+        remainder = {c - cc for c in group}
         if len(remainder) < 2:
             continue
 
@@ -181,7 +201,7 @@ def extract_single_row_node_once(F: Expr, *, node_prefix: str, next_id: int):
 
         # Rewrite F: remove group, add node * cc
         newF = set(F) - group
-        newF.add(frozenset(set(cc) | {node}))
+        newF.add(cc | frozenset({node}))
 
         return newF, new_defs, True, next_id
 
@@ -1,6 +1,8 @@
 from __future__ import annotations
 from typing import FrozenSet, Set, List, Tuple
 
+from .encoding import LitPool, common_cube_bits
+
 Literal = str
 Cube = FrozenSet[Literal]
 Expr = Set[Cube]
@@ -38,50 +40,70 @@ def kernels(F: Expr) -> List[Tuple[Cube, Expr]]:
     co_kernel is a cube (frozenset of literals).
     kernel_expr is cube-free expression (set of cubes).
     """
+    # Encode cubes as int bitmasks once; the recursion then runs entirely on
+    # int bitwise ops (subset/union/difference in one machine op each) instead
+    # of hashing and copying small frozensets at every level.
+    pool = LitPool()
+    for lit in sorted({lit for c in F for lit in c}):
+        pool.bit(lit)  # assign bits alphabetically so recursion order is stable
+    F_bits = pool.encode_expr(F)
+
     out: List[Tuple[Cube, Expr]] = []
-    seen: Set[Tuple[Cube, Tuple[Cube, ...]]] = set()  # for dedup
+    # Memo of visited (co-kernel, canonical sub-expression) states: dividing
+    # by the same literals in a different order reaches the same state, and
+    # without this memo the whole subtree below it is re-explored every time.
+    visited: Set[Tuple[int, Tuple[int, ...]]] = set()
+    # common_cube result per canonical sub-expression (the same quotient
+    # can be reached under several co-kernels).
+    cc_cache: dict[Tuple[int, ...], int] = {}
+
+    # Explicit DFS stack instead of Python recursion: each state is pure int
+    # and set-of-int arithmetic, so the per-node cost is the work itself
+    # rather than frame setup, and deep kernel chains can't hit the
+    # recursion limit. Children are pushed in reverse literal order so
+    # states are still explored in ascending literal order (pre-order).
+    stack: List[Tuple[Set[int], int]] = [(F_bits, 0)]  # start with co-kernel = 1
+    while stack:
+        expr, co = stack.pop()
+        if not expr:
+            continue
 
-    def canon_expr(expr: Expr) -> Tuple[Cube, ...]:
-        # canonical ordering so we can deduplicate kernels reliably
-        # This is important to avoid infinite recursion and redundant work.
-        return tuple(sorted(expr, key=lambda c: (len(c), tuple(sorted(c)))))
+        # Canonical key: sorted tuple of the int cube masks. Tuples of small
+        # ints hash at C speed and the key is exact (no collision caveat).
+        canon = tuple(sorted(expr))
+        key = (co, canon)
+        if key in visited:
+            continue
+        visited.add(key)
 
-    def recurse(expr: Expr, co: Cube):
-        """
-        Explore kerneling starting from expr, with current co-kernel 'co'.
-        """
-        if not expr:
-            return
+        cc = cc_cache.get(canon)
+        if cc is None:
+            cc = common_cube_bits(expr)
+            cc_cache[canon] = cc
 
         # If cube-free, record this (co, expr) as a kernel pair.
-        if is_cube_free(expr):
-            key = (co, canon_expr(expr))
-            if key not in seen:
-                seen.add(key)
-                out.append((co, set(expr)))  # copy
+        # (each (co, expr) state is visited once, so no extra dedup is needed)
+        if cc == 0:
+            out.append((pool.decode_cube(co), pool.decode_expr(expr)))
             # Important: even if cube-free, there may be deeper kernels too.
 
         # Count literal occurrences (in how many cubes each literal appears)
         lit_count = {}
         for c in expr:
-            for lit in c:
-                lit_count[lit] = lit_count.get(lit, 0) + 1
+            while c:
+                bit = c & -c
+                lit_count[bit] = lit_count.get(bit, 0) + 1
+                c &= c - 1
 
-        # Recurse on literals that occur in >= 2 cubes
-        for lit, count in sorted(lit_count.items()):
+        # Descend on literals that occur in >= 2 cubes
+        for bit, count in sorted(lit_count.items(), reverse=True):
             if count < 2:
                 continue
 
-            # Build subexpression of cubes containing lit
-            sub = {c for c in expr if lit in c}
-
-            # Divide sub by lit: remove lit from each cube
-            quotient = {frozenset(set(c) - {lit}) for c in sub}
+            # Divide the cubes containing this literal by it (drop the bit)
+            quotient = {c & ~bit for c in expr if c & bit}
 
             # New co-kernel = old co * lit
-            new_co = frozenset(set(co) | {lit})
-
-            recurse(quotient, new_co)
+            stack.append((quotient, co | bit))
 
-    recurse(F, frozenset())  # start with co-kernel = 1
     return out
@@ -1,7 +1,10 @@
 from __future__ import annotations
 from dataclasses import dataclass
+from functools import cached_property
 from typing import FrozenSet, Set, Tuple, List, Dict
 
+from .encoding import LitPool
+
 Literal = str
 Cube = FrozenSet[Literal]
 Expr = Set[Cube]
@@ -26,11 +29,46 @@ def canon_expr(e: Expr) -> Tuple[Tuple[str, ...], ...]:
 class KernelMatrix:
     rows: List[Cube]                      # co-kernels
     cols: List[Expr]                      # kernels
-    M: List[List[int]]                    # dense 0/1 matrix
     ones: Set[Tuple[int, int]]            # sparse set of (row_i, col_j) where M=1
 
     row_index: Dict[Cube, int]
-    col_index: Dict[Tuple[Tuple[str, ...], ...], int]  # canonical kernel -> col idx
+    col_index: Dict[Tuple[int, ...], int]  # sorted cube-mask tuple -> col idx
+
+    def has_one(self, i: int, j: int) -> bool:
+        return (i, j) in self.ones
+
+    @cached_property
+    def bit_masks(self) -> Tuple[List[int], List[int]]:
+        """
+        Both orientations of the incidence as int bitmasks, built in one
+        pass over `ones` and cached:
+          col_masks[j] = bitmask of row indices i where M[i][j] == 1
+          row_masks[i] = bitmask of col indices j where M[i][j] == 1
+
+        The rectangle enumeration works entirely on these; computing them
+        here means repeated enumerations over one matrix share a single
+        pass over the sparse ones set.
+        """
+        col_masks = [0] * len(self.cols)
+        row_masks = [0] * len(self.rows)
+        for (i, j) in self.ones:
+            col_masks[j] |= 1 << i
+            row_masks[i] |= 1 << j
+        return col_masks, row_masks
+
+    @cached_property
+    def M(self) -> List[List[int]]:
+        """
+        Dense 0/1 matrix, materialized lazily from `ones` on first access.
+
+        All hot paths work off the sparse `ones` set; the dense form is only
+        touched by print_kernel_matrix, so don't pay O(rows*cols) for it
+        unless someone actually asks.
+        """
+        m = [[0] * len(self.cols) for _ in range(len(self.rows))]
+        for (i, j) in self.ones:
+            m[i][j] = 1
+        return m
 
 
 def build_kernel_matrix(pairs: List[Tuple[Cube, Expr]]) -> KernelMatrix:
@@ -44,48 +82,60 @@ def build_kernel_matrix(pairs: List[Tuple[Cube, Expr]]) -> KernelMatrix:
       pairs: list of (co_kernel, kernel_expr) from kernel extraction
     """
 
+    # 0) Key each kernel exactly once by the sorted tuple of its int cube
+    #    masks: exact (unlike a hash fingerprint) and hashed at int speed
+    #    (no tuple-of-tuples of strings to build and compare). Bits are
+    #    assigned to literals in sorted order so the keys — and hence
+    #    column order — are deterministic.
+    pool = LitPool()
+    for lit in sorted({lit for (_, k) in pairs for c in k for lit in c}):
+        pool.bit(lit)
+
+    cube_masks: Dict[Cube, int] = {}
+
+    def _key_kernel(k: Expr) -> Tuple[int, ...]:
+        masks = []
+        for c in k:
+            m = cube_masks.get(c)
+            if m is None:
+                m = pool.encode_cube(c)
+                cube_masks[c] = m
+            masks.append(m)
+        masks.sort()
+        return tuple(masks)
+
+    keyed_pairs = [(co, k, _key_kernel(k)) for (co, k) in pairs]
+
     # 1) Collect unique co-kernels
     uniq_rows = sorted(
-        {co for (co, _) in pairs},
+        {co for (co, _, _) in keyed_pairs},
         key=lambda c: (len(c), canon_cube(c))
     )
 
-    # 2) Collect unique kernels, but dedup by canonical expression
-    uniq_cols_canon = sorted(
-        {canon_expr(k) for (_, k) in pairs},
-        key=lambda ce: (len(ce), ce)
-    )
-
-    # 3) Build index maps
-    row_index = {co: i for i, co in enumerate(uniq_rows)}
-    col_index = {ck: j for j, ck in enumerate(uniq_cols_canon)}
-
-    # 4) Recover actual Expr objects for cols (pick one representative per canonical form)
+    # 2) Recover actual Expr objects for cols (one representative per key)
     #    (We need to display/print actual kernels later.)
-    rep_kernel: Dict[Tuple[Tuple[str, ...], ...], Expr] = {}
-    for _, k in pairs:
-        ck = canon_expr(k)
+    rep_kernel: Dict[Tuple[int, ...], Expr] = {}
+    for _, k, ck in keyed_pairs:
         if ck not in rep_kernel:
             rep_kernel[ck] = set(k)
 
-    uniq_cols = [rep_kernel[ck] for ck in uniq_cols_canon]
+    # 3) Unique kernels, ordered smallest-first
+    uniq_col_keys = sorted(rep_kernel, key=lambda ck: (len(ck), ck))
 
-    # 5) Fill sparse ones
-    ones: Set[Tuple[int, int]] = set()
-    for co, k in pairs:
-        i = row_index[co]
-        j = col_index[canon_expr(k)]
-        ones.add((i, j))
+    # 4) Build index maps
+    row_index = {co: i for i, co in enumerate(uniq_rows)}
+    col_index = {ck: j for j, ck in enumerate(uniq_col_keys)}
 
-    # 6) (Optional) build dense matrix
-    m = [[0] * len(uniq_cols) for _ in range(len(uniq_rows))]
-    for (i, j) in ones:
-        m[i][j] = 1
+    uniq_cols = [rep_kernel[ck] for ck in uniq_col_keys]
+
+    # 5) Fill sparse ones (reusing the cached keys)
+    ones: Set[Tuple[int, int]] = set()
+    for co, _, ck in keyed_pairs:
+        ones.add((row_index[co], col_index[ck]))
 
     return KernelMatrix(
         rows=uniq_rows,
         cols=uniq_cols,
-        M=m,
         ones=ones,
         row_index=row_index,
         col_index=col_index,
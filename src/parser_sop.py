@@ -1,4 +1,8 @@
-from .printing_expressions import print_expression, print_cubes_vertical
+__all__ = ["parse_sop"]
+
+# Strip all whitespace in a single C-level pass (str.translate).
+_WS = str.maketrans("", "", " \t\n\r")
+
 
 def parse_sop(expression: str):
     """
@@ -10,22 +14,6 @@ def parse_sop(expression: str):
     Output:
         Set of cubes, where each cube is a frozenset of literals
     """
-
-    # Remove spaces
-    expression = expression.replace(" ", "")
-
-    # Split into product terms (cubes)
-    cube_strings = expression.split("+")
-
-    cubes = set()
-
-    for cube_str in cube_strings:
-        if cube_str == "":
-            continue
-
-        # Each character is a literal
-        cube = frozenset(cube_str)
-        cubes.add(cube)
-
-    return cubes
-
+    # Each '+'-separated term is a cube; each character a literal.
+    # filter(None, ...) skips empty terms (e.g. "a++b" or a trailing '+').
+    return {frozenset(term) for term in filter(None, expression.translate(_WS).split("+"))}
@@ -1,6 +1,8 @@
 from __future__ import annotations
 from dataclasses import dataclass
-from typing import List, Set, Tuple, Dict, Iterable, Optional
+from typing import Callable, List, Set, Tuple, Dict, Iterable, Optional
+
+from .encoding import LitPool
 
 @dataclass(frozen=True)
 class Rectangle:
@@ -20,28 +22,34 @@ class Rectangle:
         return self.nrows * self.ncols
 
 
-def _build_col_rows(KM) -> List[Set[int]]:
-    """
-    col_rows[j] = set of row indices i where M[i][j] == 1
-    Uses KM.ones (sparse) for efficiency.
-    """
-    col_rows: List[Set[int]] = [set() for _ in range(len(KM.cols))]
-    for (i, j) in KM.ones:
-        col_rows[j].add(i)
-    return col_rows
+def _mask_to_indices(mask: int) -> Set[int]:
+    """Expand an int bitmask back into the set of positions of its set bits."""
+    out = set()
+    while mask:
+        out.add((mask & -mask).bit_length() - 1)
+        mask &= mask - 1
+    return out
 
 
-def _closure_cols_from_rows(col_rows: List[Set[int]], rows: Set[int]) -> Set[int]:
+def _closure_cols_from_rows(row_masks: List[int], rows_mask: int) -> int:
     """
-    Given a set of rows R, return the maximal set of columns C*
-    such that for every col in C*, rows ⊆ col_rows[col].
+    Given a row bitmask R, return the maximal set of columns C* (as a
+    column bitmask) such that every row of R has a 1 in every col of C*.
+
+    C* is exactly the intersection of the rows' column masks, so the cost
+    is one AND per row in R rather than a subset test per column of the
+    matrix (the sparse-intersection closure of the covering literature,
+    with bitmasks standing in for the sorted lists).
     """
-    if not rows:
-        return set()
-    out = set()
-    for j, rset in enumerate(col_rows):
-        if rows.issubset(rset):
-            out.add(j)
+    if rows_mask == 0:
+        return 0
+    out = -1
+    while rows_mask:
+        i = (rows_mask & -rows_mask).bit_length() - 1
+        out &= row_masks[i]
+        if out == 0:
+            return 0
+        rows_mask &= rows_mask - 1
     return out
 
 
@@ -50,6 +58,7 @@ def enumerate_closed_rectangles(
     min_rows: int = 2,
     min_cols: int = 2,
     max_rectangles: Optional[int] = None,
+    prune: bool = True,
 ) -> List[Rectangle]:
     """
     Enumerate 'closed' rectangles (all-1 submatrices) using a DFS over column sets.
@@ -60,51 +69,162 @@ def enumerate_closed_rectangles(
     - Record rectangle (R(C), C*) if big enough.
 
     Dedup by (rows, cols).
+    With prune=True (default), branches whose optimistic cube-count profit
+    cannot beat the best rectangle recorded so far are cut: rows only
+    shrink while descending and the cube-count profit r*t - (r+t) grows
+    with both r and t, so |rows| and the total cube count over all columns
+    bound every descendant. Pass prune=False to enumerate exhaustively.
     Works well for coursework-size matrices; can blow up on huge instances.
     """
-    col_rows = _build_col_rows(KM)
-    ncols = len(KM.cols)
+    col_masks, row_masks = KM.bit_masks
+    col_cube_ids = _col_cube_ids(KM)
+
+    return [
+        Rectangle(frozenset(_mask_to_indices(rm)), frozenset(_mask_to_indices(cm)))
+        for rm, cm in _enumerate_dfs(
+            col_masks,
+            row_masks,
+            col_cube_ids,
+            min_rows=min_rows,
+            min_cols=min_cols,
+            max_rectangles=max_rectangles,
+            prune=prune,
+        )
+    ]
+
+
+def _col_cube_ids(KM) -> List[frozenset[int]]:
+    """
+    Per-column cube-id sets so the DFS core can evaluate its cube-count
+    pruning surrogate without touching KM.
+    """
+    cube_ids: Dict = {}
+    col_cube_ids: List[frozenset[int]] = []
+    for col in KM.cols:
+        ids = set()
+        for cube in col:
+            cid = cube_ids.get(cube)
+            if cid is None:
+                cid = len(cube_ids)
+                cube_ids[cube] = cid
+            ids.add(cid)
+        col_cube_ids.append(frozenset(ids))
+    return col_cube_ids
+
+
+def _enumerate_dfs(
+    col_masks: List[int],
+    row_masks: List[int],
+    col_cube_ids: List[frozenset[int]],
+    *,
+    min_rows: int,
+    min_cols: int,
+    max_rectangles: Optional[int],
+    prune: bool,
+):
+    """
+    DFS core of the rectangle enumeration, operating purely on int bitmasks
+    and yielding (rows_mask, cols_mask) pairs as they are discovered.
+
+    A generator so consumers can process rectangles while the DFS runs:
+    enumerate_closed_rectangles materializes the list, while
+    enumerate_and_pick_best folds the stream into a running argmax and
+    never holds more than one rectangle at a time.
+
+    Kept free of KernelMatrix/Rectangle objects on purpose: everything here
+    is int and set arithmetic, the form a compiled (Cython/Numba) port of
+    this loop would take. This tree stays dependency-free, so the wrappers
+    simply drive this in plain Python.
+    """
+    ncols = len(col_masks)
+
+    emitted = 0
+    seen: Set[Tuple[int, int]] = set()
+
+    # Upper bound on t = |T| for any column union (for the pruning bound)
+    max_t = len(frozenset().union(*col_cube_ids)) if col_cube_ids else 0
+    best_prof = -1  # best cube-count profit recorded so far
+
+    # Closure memo: column-addition order doesn't matter, so many DFS nodes
+    # share the same row-set and would recompute the same closure.
+    closure_cache: dict[int, int] = {}
+
+    # Explicit DFS stack of (start_col, rows_mask) frames instead of Python
+    # recursion: no per-node frame setup and no recursion-limit worries on
+    # big matrices. Seeds (and children below) are pushed in reverse column
+    # order so the LIFO pop reproduces the old recursive pre-order exactly.
+    # Smallest start column from which each row-set has been expanded
+    visited_rows: dict[int, int] = {}
+
+    # Seed columns ordered by descending row count (degeneracy ordering):
+    # row-rich branches tend to carry the most profitable rectangles, so
+    # exploring them first raises best_prof early and sharpens the
+    # branch-and-bound cut for everything after. The stack is LIFO, so
+    # seeds are pushed in the reverse of the intended visit order.
+    seed_order = sorted(
+        (j for j in range(ncols)
+         if col_masks[j].bit_count() >= min_rows),  # same popcount prune as below
+        key=lambda j: col_masks[j].bit_count(),
+    )
+    stack: List[Tuple[int, int]] = [(j + 1, col_masks[j]) for j in seed_order]
+
+    while stack:
+        # Optional cap
+        if max_rectangles is not None and emitted >= max_rectangles:
+            break
 
-    out: List[Rectangle] = []
-    seen: Set[Tuple[frozenset[int], frozenset[int]]] = set()
+        start_col, rows_mask = stack.pop()
 
-    def record(rows: Set[int], cols: Set[int]):
-        rect = Rectangle(frozenset(rows), frozenset(cols))
-        key = (rect.rows, rect.cols)
-        if key in seen:
-            return
-        if rect.nrows >= min_rows and rect.ncols >= min_cols:
-            seen.add(key)
-            out.append(rect)
+        # Different column-addition orders reach the same row-set; if this
+        # row-set was already expanded from an equal-or-smaller start column,
+        # that expansion explored a superset of the extensions available
+        # here, so the whole subtree is redundant.
+        prev_start = visited_rows.get(rows_mask)
+        if prev_start is not None and prev_start <= start_col:
+            continue
+        visited_rows[rows_mask] = start_col
 
-    def dfs(start_col: int, current_cols: List[int], current_rows: Set[int]):
-        # Optional cap
-        if max_rectangles is not None and len(out) >= max_rectangles:
-            return
+        # Branch-and-bound cut: no descendant can beat the best seen so far
+        if prune and best_prof >= 0:
+            r = rows_mask.bit_count()
+            if r * max_t - (r + max_t) <= best_prof:
+                continue
 
-        # Compute closure on columns
-        closed_cols = _closure_cols_from_rows(col_rows, current_rows)
-        record(current_rows, closed_cols)
+        # Compute closure on columns (memo lookup inlined in the hot loop)
+        closed_cols = closure_cache.get(rows_mask)
+        if closed_cols is None:
+            closed_cols = _closure_cols_from_rows(row_masks, rows_mask)
+            closure_cache[rows_mask] = closed_cols
+
+        # Record (yield) the closed rectangle at this node, once per
+        # distinct (rows, cols) pair and only if big enough.
+        key = (rows_mask, closed_cols)
+        if key not in seen:
+            r = rows_mask.bit_count()
+            if r >= min_rows and closed_cols.bit_count() >= min_cols:
+                seen.add(key)
+                emitted += 1
+                if prune:
+                    t = len(frozenset().union(
+                        *(col_cube_ids[j] for j in _mask_to_indices(closed_cols))
+                    ))
+                    prof = r * t - (r + t)
+                    if prof > best_prof:
+                        best_prof = prof
+                yield key
 
         # Try extending with a new column > start_col
         # Only try columns not already in closure; adding a column in the closure changes nothing.
-        for j in range(start_col, ncols):
-            if j in closed_cols:
+        for j in range(ncols - 1, start_col - 1, -1):
+            if (closed_cols >> j) & 1:
                 continue
-            # New row intersection
-            new_rows = current_rows & col_rows[j]
-            if not new_rows:
+            # New row intersection; rows only shrink while descending, so a
+            # branch that already dropped below min_rows can never record a
+            # rectangle — one AND plus a popcount skips it outright.
+            new_rows = rows_mask & col_masks[j]
+            if new_rows.bit_count() < min_rows:
                 continue
-            dfs(j + 1, current_cols + [j], new_rows)
-
-    # Seed DFS from each column
-    for j in range(ncols):
-        seed_rows = set(col_rows[j])
-        if not seed_rows:
-            continue
-        dfs(j + 1, [j], seed_rows)
-
-    return out
+            stack.append((j + 1, new_rows))
 
 def rectangle_profit_cubecount(KM, rect: Rectangle) -> int:
     """
@@ -119,21 +239,63 @@ def rectangle_profit_cubecount(KM, rect: Rectangle) -> int:
     Profit = r*t - (r + t)
     """
     r = rect.nrows
-    # Build T size without actually building full T: union of cubes across selected kernels
+    # Union of cubes across selected kernels (update avoids copying each
+    # already-set KM.cols[j] into a temporary)
     T = set()
     for j in rect.cols:
-        T |= set(KM.cols[j])
+        T.update(KM.cols[j])
     t = len(T)
 
     return r * t - (r + t)
 
-def _lit_cost_cube(cube) -> int:
-    return len(cube)
+def _union_cols(KM, cols: frozenset, cache: Optional[Dict[frozenset, set]] = None) -> set:
+    """
+    Union of kernel cubes across the selected columns.
+
+    Many rectangles share a column set, so best_rectangle passes a cache
+    keyed on it and the union is built only once per distinct col-set.
+    """
+    if cache is not None:
+        T = cache.get(cols)
+        if T is not None:
+            return T
+    T = set()
+    for j in cols:
+        T.update(KM.cols[j])
+    if cache is not None:
+        cache[cols] = T
+    return T
+
+
+def _cube_mask_fn() -> Callable:
+    """
+    Memoized cube -> literal-bitmask encoder for profit evaluation.
+
+    One LitPool assigns each literal of the alphabet a bit; every cube is
+    encoded once and looked up thereafter, so the profit inner loop works
+    on ints: union is '|', the literal count is bit_count(). Python ints
+    grow as needed, so alphabets beyond 64 literals need no special case.
+    """
+    pool = LitPool()
+    masks: Dict = {}
+
+    def cube_mask(cube) -> int:
+        m = masks.get(cube)
+        if m is None:
+            m = pool.encode_cube(cube)
+            masks[cube] = m
+        return m
 
-def _lit_cost_expr(expr) -> int:
-    return sum(_lit_cost_cube(c) for c in expr)
+    return cube_mask
 
-def rectangle_profit(KM, rect) -> int:
+
+def rectangle_profit(
+    KM,
+    rect,
+    *,
+    T_cache: Optional[Dict[frozenset, set]] = None,
+    cube_mask: Optional[Callable] = None,
+) -> int:
     """
     Literal-count profit for extracting a rectangle.
 
@@ -155,42 +317,108 @@ def rectangle_profit(KM, rect) -> int:
     Profit = literals_before - literals_after
     """
 
-    # Resolve actual row cubes from indices
-    R = [KM.rows[i] for i in rect.rows]
+    if cube_mask is None:
+        cube_mask = _cube_mask_fn()
 
-    # Union of kernel cubes across selected columns
-    T = set()
-    for j in rect.cols:
-        T |= set(KM.cols[j])  # KM.cols[j] is Expr = set of cubes
+    # Resolve row cubes / column union as literal bitmasks
+    R = [cube_mask(KM.rows[i]) for i in rect.rows]
+    T = [cube_mask(t) for t in _union_cols(KM, rect.cols, T_cache)]
+
+    return _profit_kernel(R, T)
 
+
+def _profit_kernel(R: List[int], T: List[int]) -> int:
+    """
+    Literal-count profit on encoded cubes — the pure-integer inner loop of
+    rectangle_profit (ORs, popcounts and a set of ints only, so it is the
+    piece a compiled port would target; this dependency-free tree runs it
+    in plain Python).
+    """
     # BEFORE: literal cost of all unique cubes in the covered region
-    covered = set()
-    for r in R:
-        for t in T:
-            covered.add(frozenset(set(r) | set(t)))
-    before = sum(len(c) for c in covered)
+    # (cube union is a single int OR; dedup is a set of ints)
+    covered = {r | t for r in R for t in T}
+    before = sum(c.bit_count() for c in covered)
 
     # AFTER:
     # definition cost of X = sum(R)
-    def_cost = sum(len(r) for r in R)
+    def_cost = sum(r.bit_count() for r in R)
 
     # top-level usage: X * T  (treat X as 1 literal per product cube)
-    use_cost = sum(1 + len(t) for t in T)
-
-    after = def_cost + use_cost
+    use_cost = sum(1 + t.bit_count() for t in T)
 
-    return before - after
+    return before - (def_cost + use_cost)
 
 
 
 def best_rectangle(KM, rectangles):
     best = None
     best_key = None
+    # Shared across all profit evaluations: rectangles with the same column
+    # set reuse one T union instead of rebuilding it per rectangle, and the
+    # literal-bitmask encoding of each cube is computed once.
+    t_cache: Dict[frozenset, set] = {}
+    cube_mask = _cube_mask_fn()
+    # Profit per (rows, cols): the enumerator dedups, but callers may pass
+    # any iterable of rectangles, and repeats cost a dict hit instead of a
+    # covered-region rebuild.
+    prof_cache: Dict[Tuple[frozenset, frozenset], int] = {}
     for r in rectangles:
-        prof = rectangle_profit(KM, r)
+        rkey = (r.rows, r.cols)
+        prof = prof_cache.get(rkey)
+        if prof is None:
+            prof = rectangle_profit(KM, r, T_cache=t_cache, cube_mask=cube_mask)
+            prof_cache[rkey] = prof
         key = (prof, r.area, r.nrows, r.ncols)
         if best is None or key > best_key:
             best = r
             best_key = key
     return best
 
+
+def enumerate_and_pick_best(
+    KM,
+    min_rows: int = 2,
+    min_cols: int = 2,
+    max_rectangles: Optional[int] = None,
+    prune: bool = True,
+) -> Tuple[Optional[Rectangle], Optional[int]]:
+    """
+    Enumerate closed rectangles and return (best_rectangle, profit) in one
+    fused pass.
+
+    Folds the DFS stream straight into the running argmax instead of
+    materializing the full rectangle list and scanning it again: peak
+    memory stays O(1) in the number of rectangles, and the answer no
+    longer depends on which rectangles a max_rectangles cap happened to
+    keep before the good ones were even generated.
+
+    Same selection key as best_rectangle (literal-count profit, then area,
+    rows, cols). Returns (None, None) if no rectangle qualifies.
+    """
+    col_masks, row_masks = KM.bit_masks
+    col_cube_ids = _col_cube_ids(KM)
+
+    best: Optional[Rectangle] = None
+    best_key = None
+    best_prof: Optional[int] = None
+    t_cache: Dict[frozenset, set] = {}
+    cube_mask = _cube_mask_fn()
+
+    for rm, cm in _enumerate_dfs(
+        col_masks,
+        row_masks,
+        col_cube_ids,
+        min_rows=min_rows,
+        min_cols=min_cols,
+        max_rectangles=max_rectangles,
+        prune=prune,
+    ):
+        r = Rectangle(frozenset(_mask_to_indices(rm)), frozenset(_mask_to_indices(cm)))
+        prof = rectangle_profit(KM, r, T_cache=t_cache, cube_mask=cube_mask)
+        key = (prof, r.area, r.nrows, r.ncols)
+        if best is None or key > best_key:
+            best = r
+            best_key = key
+            best_prof = prof
+    return best, best_prof
+
@@ -1,12 +1,12 @@
 from __future__ import annotations
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import Dict, Set, FrozenSet, Tuple, Optional, List
 
 from .kernel import kernels
 from .matrix import build_kernel_matrix
-from .rectangles import enumerate_closed_rectangles, best_rectangle, rectangle_profit
+from .rectangles import enumerate_and_pick_best
 from .factor import apply_rectangle_once, extract_common_cube_once, extract_single_row_node_once
-from .printing_expressions import print_cubes_vertical, pretty_cube, print_kernel_matrix
 
 Literal = str
 Cube = FrozenSet[Literal]
@@ -26,37 +26,52 @@ class SynthesisResult:
     next_id: int 
 
 
-def synthesize_by_rectangles(
+@lru_cache(maxsize=64)
+def _kernels_cached(F_frozen: FrozenSet[Cube]) -> List[Tuple[Cube, Expr]]:
+    """
+    kernels() keyed by the (hashable) frozenset of cubes.
+
+    The same expression recurs across synthesis passes — e.g. a definition
+    factored by the worklist below was current_F's quotient moments
+    earlier, and unprofitable iterations revisit an unchanged F. Callers
+    must treat the cached pairs as read-only; build_kernel_matrix only
+    reads them.
+    """
+    return kernels(set(F_frozen))
+
+
+def _extract_loop(
     F: Expr,
     *,
-    node_prefix: str = "t",
-    start_id: int = 1,
-    max_iters: int = 50,
-    min_rows: int = 1,
-    min_cols: int = 1,
-    max_rectangles: int = 5000,
-    factor_defs: bool = True,
-    require_positive_profit: bool = True,
-    max_def_depth: int = 10,
-    verbose: bool = False,
-) -> SynthesisResult:
+    node_prefix: str,
+    next_id: int,
+    max_iters: int,
+    min_rows: int,
+    min_cols: int,
+    max_rectangles: int,
+    require_positive_profit: bool,
+    verbose: bool,
+) -> Tuple[Expr, Dict[str, Expr], List[dict], int]:
     """
-    Iteratively:
-      F -> kernels -> matrix -> rectangles -> best rectangle -> extract new node -> rewrite F
+    One rectangle-extraction pass over a single expression:
+      F -> kernels -> matrix -> best rectangle -> extract new node -> rewrite F
     until no profitable rectangle exists or no kernels exist.
 
+    Shared by the top-level synthesis and the definition-factoring
+    worklist, so factoring a definition is a direct call rather than a
+    recursive trip through synthesize_by_rectangles.
+
     Returns:
-      SynthesisResult(final_expr, defs, history)
+      (final_expr, defs, history, next_id)
     """
     current_F: Expr = set(F)
     defs: Dict[str, Expr] = {}
     history: List[dict] = []
 
-    next_id = start_id
-
     for it in range(max_iters):
-        # 1) kernel extraction
-        pairs = kernels(current_F)
+        # 1) kernel extraction (memoized: identical expressions recur across
+        # iterations and definition-factoring passes)
+        pairs = _kernels_cached(frozenset(current_F))
 
         # Stop if nothing to build a matrix from
         if not pairs:
@@ -66,26 +81,20 @@ def synthesize_by_rectangles(
 
         # 2) build matrix
         KM = build_kernel_matrix(pairs)
-        #print_kernel_matrix(KM)
-
 
         if verbose:
             print(f"matrix: rows={len(KM.rows)} cols={len(KM.cols)} ones={len(KM.ones)}")
 
-        # 3) enumerate rectangles
-        rects = enumerate_closed_rectangles(
+        # 3+4) enumerate rectangles and pick the best by profit, streamed in
+        # one fused pass (no full rectangle list is materialized)
+        best, prof = enumerate_and_pick_best(
             KM,
             min_rows=min_rows,
             min_cols=min_cols,
             max_rectangles=max_rectangles,
         )
 
-
-        if verbose:
-            print(f"rectangles: {len(rects)}")
-
-
-        if not rects:
+        if best is None:
             newF2, new_defs, changed, next_id = extract_single_row_node_once(
                 current_F,
                 node_prefix=node_prefix,
@@ -115,16 +124,6 @@ def synthesize_by_rectangles(
             break
 
 
-        # 4) pick best by profit
-        best = best_rectangle(KM, rects)
-        if best is None:
-            if verbose:
-                print("Stop: no best rectangle (unexpected).")
-            break
-
-        prof = rectangle_profit(KM, best)
-
-
         if verbose:
             print(f"best rectangle profit: {prof}  (rows={best.nrows}, cols={best.ncols})")
 
@@ -164,7 +163,9 @@ def synthesize_by_rectangles(
         node_name = f"{node_prefix}{next_id}"
         next_id += 1
 
-        newF, new_defs, covered = apply_rectangle_once(current_F, KM, best, new_node=node_name, strict=False, warn=True)
+        # warn follows verbose: the inexact-coverage warning is the one print
+        # apply_rectangle_once can emit per iteration, so quiet runs stay quiet
+        newF, new_defs, covered = apply_rectangle_once(current_F, KM, best, new_node=node_name, strict=False, warn=verbose)
 
         # Merge defs (sanity: no overwrite)
         if node_name in defs:
@@ -189,12 +190,51 @@ def synthesize_by_rectangles(
             if verbose:
                 print("Stop: expression became empty (0).")
             break
+
+    return current_F, defs, history, next_id
+
+
+def synthesize_by_rectangles(
+    F: Expr,
+    *,
+    node_prefix: str = "t",
+    start_id: int = 1,
+    max_iters: int = 50,
+    min_rows: int = 1,
+    min_cols: int = 1,
+    max_rectangles: int = 5000,
+    factor_defs: bool = True,
+    require_positive_profit: bool = True,
+    max_def_depth: int = 10,
+    verbose: bool = False,
+) -> SynthesisResult:
+    """
+    Iteratively:
+      F -> kernels -> matrix -> rectangles -> best rectangle -> extract new node -> rewrite F
+    until no profitable rectangle exists or no kernels exist.
+
+    Returns:
+      SynthesisResult(final_expr, defs, history)
+    """
+    final_expr, defs, history, next_id = _extract_loop(
+        F,
+        node_prefix=node_prefix,
+        next_id=start_id,
+        max_iters=max_iters,
+        min_rows=min_rows,
+        min_cols=min_cols,
+        max_rectangles=max_rectangles,
+        require_positive_profit=require_positive_profit,
+        verbose=verbose,
+    )
+
     # ------------------------------------------------------------
-    # Recursively factor generated node definitions (t1, t2, ...)
+    # Factor generated node definitions (t1, t2, ...)
     # ------------------------------------------------------------
     if factor_defs and defs:
-        # Worklist recursion so we factor every new definition created.
-        #print("Factoring definitions...")
+        # Flat worklist over pending definitions: each runs the same
+        # extraction loop directly (no recursive wrapper call), and all
+        # passes share the module-level kernel cache.
         work = list(defs.keys())
         seen = set()
         depth = 0
@@ -205,46 +245,36 @@ def synthesize_by_rectangles(
                 continue
             seen.add(name)
 
-            sub_F = defs[name]
-
-            # Factor this definition (but don't recurse again inside the call;
-            # we manage recursion explicitly with the worklist)
-            sub_res = synthesize_by_rectangles(
-                sub_F,
+            sub_expr, sub_defs, sub_history, next_id = _extract_loop(
+                defs[name],
                 node_prefix=node_prefix,
-                start_id=next_id,              # keep unique node numbering globally
+                next_id=next_id,               # keep unique node numbering globally
                 max_iters=max_iters,
                 min_rows=min_rows,
                 min_cols=min_cols,
                 max_rectangles=max_rectangles,
-                factor_defs=False,             # IMPORTANT: avoid infinite recursion
                 require_positive_profit=require_positive_profit,
-                max_def_depth=max_def_depth,
                 verbose=verbose,
             )
 
-            # Update global next_id so future nodes don't collide
-            next_id = sub_res.next_id
-
             # Replace the definition with its factored form
-            defs[name] = sub_res.final_expr
+            defs[name] = sub_expr
 
             # Merge nested defs produced while factoring this def
-            for k, v in sub_res.defs.items():
+            for k, v in sub_defs.items():
                 if k in defs:
                     raise RuntimeError(f"Internal error: node name collision in defs: {k}")
                 defs[k] = v
                 work.append(k)
 
             # (optional) record in history that we factored a node definition
-            if sub_res.history:
+            if sub_history:
                 history.append({
                     "iter": None,
                     "node": name,
-                    "note": f"factored definition {name} ({len(sub_res.history)} extractions)",
+                    "note": f"factored definition {name} ({len(sub_history)} extractions)",
                 })
 
             depth += 1
 
-
-    return SynthesisResult(final_expr=current_F, defs=defs, history=history, next_id=next_id)
+    return SynthesisResult(final_expr=final_expr, defs=defs, history=history, next_id=next_id)
@@ -0,0 +1,43 @@
+import sys
+import os
+
+THIS_DIR = os.path.dirname(__file__)
+PROJECT_ROOT = os.path.abspath(os.path.join(THIS_DIR, ".."))
+sys.path.insert(0, PROJECT_ROOT)
+
+from src.parser_sop import parse_sop
+from src.encoding import (
+    LitPool,
+    common_cube_bits,
+    is_cube_free_bits,
+    divide_expression_bits,
+    multiply_cube_expr_bits,
+)
+from src.kernel import common_cube, is_cube_free
+from src.division import divide_expression
+
+
+if __name__ == "__main__":
+    F = parse_sop("a + ab + abc + ac + bd")
+
+    pool = LitPool()
+    F_bits = pool.encode_expr(F)
+
+    # Round trip must be lossless
+    assert pool.decode_expr(F_bits) == F, "encode/decode round trip failed"
+
+    # Bitmask algebra must agree with the frozenset implementations
+    assert pool.decode_cube(common_cube_bits(F_bits)) == common_cube(F)
+    assert is_cube_free_bits(F_bits) == is_cube_free(F)
+
+    d = frozenset({"a"})
+    Q, R = divide_expression(F, d)
+    Qb, Rb = divide_expression_bits(F_bits, pool.encode_cube(d))
+    assert pool.decode_expr(Qb) == Q, "bitmask quotient mismatch"
+    assert pool.decode_expr(Rb) == R, "bitmask remainder mismatch"
+
+    # Reconstruction d*Q + R == F on encoded cubes
+    recon = multiply_cube_expr_bits(pool.encode_cube(d), Qb) | Rb
+    assert pool.decode_expr(recon) == F, "bitmask reconstruction failed"
+
+    print("encoding.py test PASSED")
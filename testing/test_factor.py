@@ -91,6 +91,6 @@ if __name__ == "__main__":
 
     # --- sanity checks ---
     assert removed, "No cubes were removed; extraction did nothing."
-    assert "t1" in next(iter(newF)), "New node t1 does not appear in newF."
+    assert any("t1" in c for c in newF), "New node t1 does not appear in newF."
 
     print("\n factor.py test PASSED")